@@ -9,14 +9,27 @@
 
 # --- Core Libraries ---
 import streamlit as st
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import asyncio
+import functools
+import hashlib
 import os
-import requests
-import time
+import pathlib
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import aiohttp
 
 # --- AI & Video Processing Libraries ---
 import replicate
-from moviepy.editor import *
+# Import only the classes the fallback compositor uses; moviepy.editor eagerly
+# pulls in ImageMagick bindings, audio writers and every effect module.
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import ImageClip
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
 
 # ==============================================================================
 # 1. PAGE CONFIGURATION & API MANAGEMENT
@@ -28,19 +41,21 @@ st.set_page_config(
     layout="wide"
 )
 
-# This print statement helps us confirm in the logs that the latest code is running.
-print("--- Using App Version 2.0 with simplified requirements ---")
+@st.cache_resource
+def _bootstrap():
+    """Runs one-time setup and shares it across reruns and sessions.
 
-# Securely load API keys from Streamlit's secrets manager
-D_ID_API_KEY = st.secrets.get("D_ID_API_KEY")
-REPLICATE_API_TOKEN = st.secrets.get("REPLICATE_API_TOKEN")
-
-# Set the Replicate API token as an environment variable for the library to use
-if REPLICATE_API_TOKEN:
-    os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
-else:
-    # This error will show up on the page if the Replicate key is missing.
-    st.error("Replicate API token not found. Please add it to your Streamlit secrets to enable AI features.")
+    Streamlit re-executes this script on every interaction; caching the
+    secret lookups, environment setup and ffmpeg encoder probe keeps that
+    work out of the rerun path.
+    """
+    did_key = st.secrets.get("D_ID_API_KEY")
+    replicate_token = st.secrets.get("REPLICATE_API_TOKEN")
+    # Set the Replicate API token as an environment variable for the library to use
+    if replicate_token:
+        os.environ["REPLICATE_API_TOKEN"] = replicate_token
+    return SimpleNamespace(did_key=did_key, replicate_token=replicate_token,
+                           hw_encoder=_detect_hw_encoder())
 
 # ==============================================================================
 # 2. HELPER FUNCTIONS (The "Backend" Logic)
@@ -50,12 +65,41 @@ else:
 D_ID_URL = "https://api.d-id.com/talks"
 AVATAR_URL = "https://cdn.d-id.com/images/predefined_laura.jpg" # Using a stable, predefined avatar
 
-def create_talk(script_text):
+# Status codes worth retrying through the polling backoff loop.
+_TRANSIENT_STATUSES = {429, 502, 503, 504}
+
+# All sessions share one background event loop for D-ID work, so N active
+# users cost one polling thread and one connection pool instead of N blocked
+# Streamlit workers each running their own sleep loop.
+_DID_LOOP = None
+_DID_LOOP_LOCK = threading.Lock()
+_DID_SESSION = None
+
+def _did_loop():
+    """Returns the shared event loop running on the background D-ID thread."""
+    global _DID_LOOP
+    with _DID_LOOP_LOCK:
+        if _DID_LOOP is None or _DID_LOOP.is_closed():
+            _DID_LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_DID_LOOP.run_forever,
+                             name="did-poller", daemon=True).start()
+    return _DID_LOOP
+
+async def _did_session():
+    """Returns the shared aiohttp session (keep-alive pool + auth header).
+
+    Only touched from the _did_loop thread, so no locking is needed.
+    """
+    global _DID_SESSION
+    if _DID_SESSION is None or _DID_SESSION.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=8, keepalive_timeout=60)
+        _DID_SESSION = aiohttp.ClientSession(
+            connector=connector,
+            headers={"Authorization": f"Basic {D_ID_API_KEY}"})
+    return _DID_SESSION
+
+async def _create_talk(session, script_text):
     """Sends a script to the D-ID API to start a video generation job."""
-    if not D_ID_API_KEY:
-        st.error("D-ID API Key not found. Please ensure it is set in your Streamlit secrets.")
-        return None
-    headers = {"Authorization": f"Basic {D_ID_API_KEY}", "Content-Type": "application/json"}
     payload = {
         "script": {
             "type": "text", "input": script_text,
@@ -64,71 +108,355 @@ def create_talk(script_text):
         "source_url": AVATAR_URL,
         "config": {"result_format": "mp4"}
     }
-    try:
-        response = requests.post(D_ID_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error creating D-ID talk: {e}\nResponse: {response.text if 'response' in locals() else 'N/A'}")
-        return None
+    # If a webhook receiver is configured, D-ID will push the result there as well,
+    # so external consumers don't have to poll at all.
+    webhook_url = st.secrets.get("D_ID_WEBHOOK_URL")
+    if webhook_url:
+        payload["webhook"] = webhook_url
+    async with session.post(D_ID_URL, json=payload) as response:
+        if response.status >= 400:
+            raise RuntimeError(
+                f"Error creating D-ID talk: {response.status}\nResponse: {await response.text()}")
+        return await response.json()
 
-def get_talk_result(talk_id):
+async def _get_talk_result(session, talk_id):
     """Periodically checks the D-ID job status and returns the video URL upon completion."""
-    if not D_ID_API_KEY: return None
-    headers = {"Authorization": f"Basic {D_ID_API_KEY}"}
-    status = ""
-    while status not in ["done", "error"]:
-        try:
-            response = requests.get(f"{D_ID_URL}/{talk_id}", headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            status = result.get("status")
-            st.toast(f"D-ID video generation status: {status}...")
-            time.sleep(10)
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error getting D-ID result: {e}")
-            return None
-    if status == "error":
-        st.error(f"D-ID job failed: {result.get('result')}")
-        return None
-    return result.get("result_url")
+    # Start polling quickly and back off exponentially (1s, 1.5s, 2.25s, ...)
+    # up to 10s, so short jobs return fast and long jobs don't hammer the API.
+    delay = 1.0
+    retries_left = 3
+    while True:
+        async with session.get(f"{D_ID_URL}/{talk_id}") as response:
+            if response.status in _TRANSIENT_STATUSES and retries_left > 0:
+                retries_left -= 1
+            elif response.status >= 400:
+                raise RuntimeError(f"Error getting D-ID result: {response.status}")
+            else:
+                result = await response.json()
+                status = result.get("status")
+                if status == "error":
+                    raise RuntimeError(f"D-ID job failed: {result.get('result')}")
+                if status == "done":
+                    result_url = result.get("result_url")
+                    if not result_url:
+                        # Returning None here would get memoized by the
+                        # st.cache_data wrapper; failures must raise.
+                        raise RuntimeError("D-ID reported the job done but returned no result_url.")
+                    return result_url
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 10.0)
+
+async def _generate_presenter_video(script_text):
+    """Async body of generate_presenter_video, run on the shared D-ID loop."""
+    session = await _did_session()
+    talk_data = await _create_talk(session, script_text)
+    if not talk_data.get("id"):
+        raise RuntimeError("D-ID did not return a talk id.")
+    return await _get_talk_result(session, talk_data["id"])
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def generate_presenter_video(script_text):
+    """Runs the full D-ID pipeline (create + poll) and returns the video URL.
+
+    Cached on the script text so re-generating an identical script replays the
+    stored URL instead of paying for another D-ID render. The pipeline itself
+    runs on the shared background loop; this wrapper just waits on its future.
+    Failures propagate as exceptions on purpose: st.cache_data does not cache
+    calls that raise, so the next click retries instead of replaying a cached
+    failure for the rest of the TTL.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _generate_presenter_video(script_text), _did_loop())
+    try:
+        return future.result(timeout=900)
+    except Exception:
+        # On timeout the coroutine would otherwise keep polling the shared
+        # loop forever; cancel it before surfacing the error.
+        future.cancel()
+        raise
 
 # --- Replicate & MoviePy Functions ---
+# Content-addressed working directory: files are named by the hash of the
+# uploaded video, so identical uploads (same or different sessions) reuse
+# every pipeline stage that already ran.
+_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ss")
+
+# Shared executor for the MoviePy warm-up so clicks don't each spawn (and
+# leak) their own pool.
+_WARM_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ss-warm")
+
+def _save_upload(uploaded_file):
+    """Streams an upload into the content-addressed cache.
+
+    Hashes while copying in 1 MiB chunks, then renames the temp file to
+    {hash}.video.mp4 so downstream stages can find their cached outputs.
+    Returns the (key, path) pair.
+    """
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    h = hashlib.blake2b(digest_size=16)
+    with tempfile.NamedTemporaryFile(delete=False, dir=_CACHE_DIR) as f:
+        while chunk := uploaded_file.read(1 << 20):
+            h.update(chunk)
+            f.write(chunk)
+        tmp_path = f.name
+    key = h.hexdigest()
+    video_path = os.path.join(_CACHE_DIR, f"{key}.video.mp4")
+    os.replace(tmp_path, video_path)
+    return key, video_path
+
+def _upload_audio_to_replicate(audio_file_path):
+    """Uploads the audio to Replicate's files API and returns its URL.
+
+    The URL is cached in st.session_state keyed on the file's sha256, so
+    re-clicking Generate (or a Replicate retry) never re-sends the bytes.
+    """
+    h = hashlib.sha256()
+    with open(audio_file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    digest = h.hexdigest()
+    url_cache = st.session_state.setdefault("replicate_audio_urls", {})
+    if digest not in url_cache:
+        with open(audio_file_path, "rb") as f:
+            url_cache[digest] = replicate.files.create(f).urls["get"]
+    return url_cache[digest]
+
+def extract_audio(video_path, audio_path):
+    """Extracts the audio track with ffmpeg and returns the output path.
+
+    Re-encodes to 16 kHz mono Opus at 24 kbps: Whisper resamples to 16 kHz
+    mono internally anyway, so this shrinks the upload 10-20x for free.
+    Skips the work when the content-addressed output already exists.
+    """
+    if os.path.exists(audio_path):
+        return audio_path
+    # Encode to a temp name and publish with os.replace (as _save_upload
+    # does), so a run that dies mid-encode can't leave a partial file that
+    # later runs mistake for a finished stage.
+    with tempfile.NamedTemporaryFile(suffix=".ogg", dir=os.path.dirname(audio_path),
+                                     delete=False) as f:
+        tmp_path = f.name
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-i", video_path, "-vn", "-ac", "1", "-ar", "16000",
+             "-c:a", "libopus", "-b:a", "24k", tmp_path],
+            check=True, capture_output=True)
+        os.replace(tmp_path, audio_path)
+        return audio_path
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        st.error(f"Error extracting audio: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
 def transcribe_audio_with_timestamps(audio_file_path):
     """Transcribes audio using Whisper on Replicate to get word-level timestamps."""
     if not REPLICATE_API_TOKEN:
         st.error("Replicate API token not found. Cannot generate captions.")
         return None
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            model_endpoint = "openai/whisper:4d50797290df275329f202e48c76360b3f22b08d28c196cbc54600319435f815"
-            input_data = {"audio": audio_file, "word_timestamps": True}
-            output = replicate.run(model_endpoint, input=input_data)
-            return output.get("segments", [])
+        # Upload once and pass the URL, so retries don't re-send the bytes.
+        audio_url = _upload_audio_to_replicate(audio_file_path)
+        model_endpoint = "openai/whisper:4d50797290df275329f202e48c76360b3f22b08d28c196cbc54600319435f815"
+        input_data = {"audio": audio_url, "word_timestamps": True}
+        output = replicate.run(model_endpoint, input=input_data)
+        return output.get("segments", [])
     except Exception as e:
         st.error(f"An error occurred during transcription: {e}")
         return None
 
-def create_video_with_captions(original_video_path, segments):
-    """Uses moviepy to burn word-by-word captions onto the original video."""
+def _load_caption_font(size=70):
+    """Loads the caption font, preferring Impact with common Linux fallbacks."""
+    for name in ("Impact.ttf", "impact.ttf", "DejaVuSans-Bold.ttf",
+                 "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+def _render_word_image(word, font):
+    """Renders one caption word to an RGBA numpy array with a black outline."""
+    stroke = 2
+    probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = probe.textbbox((0, 0), word, font=font, stroke_width=stroke)
+    img = Image.new("RGBA", (right - left + 2 * stroke, bottom - top + 2 * stroke), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.text((stroke - left, stroke - top), word, font=font, fill="white",
+              stroke_width=stroke, stroke_fill="black")
+    return np.array(img)
+
+@functools.lru_cache(maxsize=1)
+def _detect_hw_encoder():
+    """Returns the first working ffmpeg hardware H.264 encoder, if any.
+
+    Being listed in `ffmpeg -encoders` only means the encoder was compiled
+    in - Debian builds list h264_nvenc on GPU-less hosts - so each candidate
+    is verified by actually encoding one test frame. Set SS_DISABLE_HWENC=1
+    to force the software encoder (e.g. for bit-reproducible output).
+    """
+    if os.environ.get("SS_DISABLE_HWENC") == "1":
+        return None
+    for encoder in ("h264_nvenc", "h264_videotoolbox"):
+        try:
+            probe = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-f", "lavfi",
+                 "-i", "color=black:size=128x128:duration=0.1",
+                 "-c:v", encoder, "-f", "null", "-"],
+                capture_output=True)
+        except FileNotFoundError:
+            return None
+        if probe.returncode == 0:
+            return encoder
+    return None
+
+def _video_encoder_args():
+    """ffmpeg output args for the best available H.264 encoder."""
+    encoder = _detect_hw_encoder()
+    if encoder == "h264_nvenc":
+        return ["-c:v", encoder, "-preset", "p4", "-rc", "vbr", "-b:v", "4M"]
+    if encoder:
+        return ["-c:v", encoder, "-b:v", "4M"]
+    return ["-c:v", "libx264", "-preset", "veryfast"]
+
+def _caption_events(segments):
+    """Flattens Whisper segments into (WORD, start, duration) tuples.
+
+    Normalizes case and whitespace once, and runs the timings through NumPy
+    arrays so empty tokens and sub-80 ms flickers are dropped with one
+    vectorized mask instead of per-word branching. Whisper always returns
+    word/start/end, so plain indexing replaces the old .get calls.
+    """
+    words = [w['word'].strip().upper() for seg in segments for w in seg['words']]
+    starts = np.fromiter((w['start'] for seg in segments for w in seg['words']),
+                         dtype=np.float32, count=len(words))
+    ends = np.fromiter((w['end'] for seg in segments for w in seg['words']),
+                       dtype=np.float32, count=len(words))
+    durations = ends - starts
+    keep = durations > 0.08
+    return [(word, float(start), float(duration))
+            for word, start, duration, ok in zip(words, starts, durations, keep)
+            if ok and word]
+
+def _video_dimensions(video_path):
+    """Returns (width, height) of the first video stream via ffprobe."""
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "csv=p=0", video_path],
+        capture_output=True, text=True, check=True).stdout
+    width, height = out.strip().split(",")[:2]
+    return int(width), int(height)
+
+def _ass_time(seconds):
+    """Formats seconds as an ASS timestamp (H:MM:SS.cc)."""
+    cs = int(round(seconds * 100))
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+def segments_to_ass(segments, play_res_x, play_res_y):
+    """Converts Whisper word segments into an ASS subtitle document.
+
+    One centered Dialogue event per word, styled to match the old TextClip
+    look (Impact 70, white fill, 2px black outline). PlayResX/PlayResY must
+    match the source video: without them libass assumes a 384x288 playfield
+    and scales the font up by video_height/288, so 70 would no longer mean
+    70 pixels.
+    """
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {play_res_x}",
+        f"PlayResY: {play_res_y}",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, "
+        "OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, "
+        "ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        "Style: Default,Impact,70,&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,"
+        "0,0,0,0,100,100,0,0,1,2,0,5,0,0,0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for word, start, duration in _caption_events(segments):
+        lines.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(start + duration)},"
+                     f"Default,,0,0,0,,{word}")
+    return "\n".join(lines) + "\n"
+
+def create_video_with_captions(original_video_path, segments, output_path, video_clip=None):
+    """Burns word-by-word captions onto the original video.
+
+    Writes the words out as an ASS subtitle file and lets a single ffmpeg
+    pass burn them in with the audio stream-copied, so no frames are pulled
+    through Python. Set SS_USE_MOVIEPY=1 to fall back to the old
+    MoviePy/Pillow compositing path (which reuses `video_clip` if the caller
+    already opened one). Skips the work when `output_path` already exists.
+    """
+    if os.path.exists(output_path):
+        return output_path
+    if os.environ.get("SS_USE_MOVIEPY") == "1":
+        return _create_video_with_captions_moviepy(original_video_path, segments,
+                                                   output_path, video_clip)
+    ass_path = original_video_path + ".ass"
+    tmp_path = None
+    try:
+        width, height = _video_dimensions(original_video_path)
+        with open(ass_path, "w") as f:
+            f.write(segments_to_ass(segments, width, height))
+        # Burn to a temp name and publish with os.replace, so a killed run
+        # can't leave a partial file that later runs serve as finished.
+        with tempfile.NamedTemporaryFile(suffix=".mp4", dir=os.path.dirname(output_path) or ".",
+                                         delete=False) as f:
+            tmp_path = f.name
+        cmd = ["ffmpeg", "-y", "-i", original_video_path, "-vf", f"ass={ass_path}"]
+        try:
+            subprocess.run(cmd + _video_encoder_args() + ["-c:a", "copy", tmp_path],
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError:
+            if _detect_hw_encoder() is None:
+                raise
+            # The hardware encoder probed OK but choked on this input;
+            # redo the burn in software rather than failing the job.
+            subprocess.run(cmd + ["-c:v", "libx264", "-preset", "veryfast",
+                                  "-c:a", "copy", tmp_path],
+                           check=True, capture_output=True)
+        os.replace(tmp_path, output_path)
+        return output_path
+    except (subprocess.CalledProcessError, FileNotFoundError, OSError, ValueError) as e:
+        st.error(f"Error creating captioned video: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+def _create_video_with_captions_moviepy(original_video_path, segments, output_path, video_clip=None):
+    """Fallback compositing path: Pillow-rendered words over a MoviePy re-encode."""
+    tmp_path = None
     try:
-        video_clip = VideoFileClip(original_video_path)
+        if video_clip is None:
+            video_clip = VideoFileClip(original_video_path)
+        font = _load_caption_font()
+        word_images = {}
         text_clips = []
-        for segment in segments:
-            for word_info in segment.get('words', []):
-                word, start, end = word_info['word'], word_info['start'], word_info['end']
-                txt_clip = TextClip(word.upper(), fontsize=70, color='white', font='Impact', stroke_color='black', stroke_width=2)
-                txt_clip = txt_clip.set_pos('center').set_duration(end - start).set_start(start)
-                text_clips.append(txt_clip)
-        
+        for word, start, duration in _caption_events(segments):
+            arr = word_images.get(word)
+            if arr is None:
+                arr = word_images[word] = _render_word_image(word, font)
+            img_clip = ImageClip(arr, transparent=True)
+            img_clip = img_clip.set_pos('center').set_duration(duration).set_start(start)
+            text_clips.append(img_clip)
+
         final_video = CompositeVideoClip([video_clip] + text_clips)
-        final_video_path = "temp_captioned_video.mp4"
-        final_video.write_videofile(final_video_path, codec='libx264', audio_codec='aac', threads=4)
-        return final_video_path
+        # Same atomic-publish dance as the ffmpeg path.
+        with tempfile.NamedTemporaryFile(suffix=".mp4", dir=os.path.dirname(output_path) or ".",
+                                         delete=False) as f:
+            tmp_path = f.name
+        final_video.write_videofile(tmp_path, codec='libx264', audio_codec='aac', threads=4)
+        os.replace(tmp_path, output_path)
+        return output_path
     except Exception as e:
         st.error(f"Error creating captioned video: {e}")
-        if "ImageMagick" in str(e):
-            st.error("MoviePy Error: ImageMagick is not installed or not found. This is usually pre-installed on Streamlit Cloud but required for local execution.")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
 
@@ -136,6 +464,14 @@ def create_video_with_captions(original_video_path, segments):
 # 3. STREAMLIT UI
 # ==============================================================================
 
+ctx = _bootstrap()
+D_ID_API_KEY = ctx.did_key
+REPLICATE_API_TOKEN = ctx.replicate_token
+
+if not REPLICATE_API_TOKEN:
+    # This error will show up on the page if the Replicate key is missing.
+    st.error("Replicate API token not found. Please add it to your Streamlit secrets to enable AI features.")
+
 st.title("Synthesis Studio 🤖🎬")
 st.write("An all-in-one AI toolkit for creating engaging short-form videos.")
 
@@ -153,18 +489,17 @@ with st.container(border=True):
         elif not D_ID_API_KEY:
             st.error("D-ID API Key is missing. Cannot generate video.")
         else:
-            with st.spinner("Sending script to our AI presenter..."):
-                talk_data = create_talk(script)
-            if talk_data and talk_data.get("id"):
-                talk_id = talk_data["id"]
-                st.info(f"Video generation job started! Please wait, this can take a few minutes.")
-                with st.spinner("AI is rendering your video..."):
-                    video_url = get_talk_result(talk_id)
-                if video_url:
-                    st.success("Your AI Presenter video is ready!")
-                    st.video(video_url)
-                else: st.error("Failed to retrieve the generated video.")
-            else: st.error("Failed to start the video generation job.")
+            st.info("Video generation job started! Please wait, this can take a few minutes.")
+            with st.spinner("AI is rendering your video..."):
+                try:
+                    video_url = generate_presenter_video(script)
+                except Exception as e:
+                    st.error(f"Error generating D-ID video: {e}")
+                    video_url = None
+            if video_url:
+                st.success("Your AI Presenter video is ready!")
+                st.video(video_url)
+            else: st.error("Failed to generate the video.")
 
 # --- Feature 2: AI Viral Captions ---
 with st.container(border=True):
@@ -179,33 +514,59 @@ with st.container(border=True):
             if not REPLICATE_API_TOKEN:
                 st.error("Replicate API Token is missing. Cannot generate captions.")
             else:
-                # Save uploaded file temporarily to process it
-                with open("temp_video.mp4", "wb") as f:
-                    f.write(caption_video_file.getbuffer())
-                
-                # Extract audio from the video
-                with st.spinner("Step 1/3: Extracting audio..."):
-                    video_clip = VideoFileClip("temp_video.mp4")
-                    audio_path = "temp_audio.mp3"
-                    video_clip.audio.write_audiofile(audio_path)
-                
-                # Transcribe the audio
-                with st.spinner("Step 2/3: Transcribing audio with Whisper AI..."):
-                    segments = transcribe_audio_with_timestamps(audio_path)
-                
-                # Burn captions onto the video
-                if segments:
-                    with st.spinner("Step 3/3: Burning captions onto your video... This is intensive!"):
-                        final_video_path = create_video_with_captions("temp_video.mp4", segments)
-                    
-                    if final_video_path:
-                        st.success("Captioned video generated!")
-                        # It's better to read the file bytes into the video element
-                        with open(final_video_path, 'rb') as f_video:
-                            video_bytes = f_video.read()
-                        st.video(video_bytes)
-                        # Re-open for the download button
-                        with open(final_video_path, 'rb') as f_download:
-                            st.download_button("Download Captioned Video", f_download, file_name="captioned_video.mp4")
-                    else: st.error("Could not create the final video.")
-                else: st.error("Could not transcribe the audio.")
+                # Stream the upload into the content-addressed cache; identical
+                # uploads map to the same paths, so finished stages are reused.
+                key, video_path = _save_upload(caption_video_file)
+                audio_path = os.path.join(_CACHE_DIR, f"{key}.audio.ogg")
+                captioned_path = os.path.join(_CACHE_DIR, f"{key}.captioned.mp4")
+
+                final_video_path = None
+                if os.path.exists(captioned_path):
+                    # This exact video was already captioned - skip the pipeline.
+                    final_video_path = captioned_path
+                else:
+                    # Extract audio from the video
+                    with st.spinner("Step 1/3: Extracting audio..."):
+                        audio_path = extract_audio(video_path, audio_path)
+
+                    # If the MoviePy fallback is active, open the clip in a worker
+                    # thread now so its cold start is hidden behind the Whisper call.
+                    warm_clip = None
+                    if os.environ.get("SS_USE_MOVIEPY") == "1":
+                        warm_clip = _WARM_POOL.submit(VideoFileClip, video_path)
+
+                    # Transcribe the audio
+                    segments = None
+                    if audio_path:
+                        with st.spinner("Step 2/3: Transcribing audio with Whisper AI..."):
+                            segments = transcribe_audio_with_timestamps(audio_path)
+
+                    # Burn captions onto the video
+                    if segments:
+                        with st.spinner("Step 3/3: Burning captions onto your video... This is intensive!"):
+                            final_video_path = create_video_with_captions(
+                                video_path, segments, captioned_path,
+                                video_clip=warm_clip.result() if warm_clip else None)
+                    else:
+                        st.error("Could not transcribe the audio.")
+                        if warm_clip:
+                            # Close the warmed clip - it holds an open ffmpeg
+                            # reader subprocess that would otherwise leak.
+                            try:
+                                warm_clip.result().close()
+                            except Exception:
+                                pass
+
+                if final_video_path:
+                    st.success("Captioned video generated!")
+                    # Read the file once; the preview below renders from
+                    # session state so reruns don't hit the disk again.
+                    st.session_state['last_video'] = pathlib.Path(final_video_path).read_bytes()
+                else: st.error("Could not create the final video.")
+
+    # Rendered outside the button gate (st.button is only True on the click
+    # itself), so the preview and download survive later reruns.
+    if 'last_video' in st.session_state:
+        video_bytes = st.session_state['last_video']
+        st.video(video_bytes)
+        st.download_button("Download Captioned Video", data=video_bytes, file_name="captioned_video.mp4")